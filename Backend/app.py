@@ -1,42 +1,145 @@
 #!/usr/bin/env python3
 """
-GENX AI Studio - Flask Backend for Model Fusion
+GENX AI Studio - FastAPI Backend for Model Fusion
 Advanced multimodal AI processing with OpenRouter and Pollinations integration
 """
 
-from flask import Flask, request, jsonify, send_file
-from flask_cors import CORS
-import json
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import uvicorn
+import orjson
+import msgspec
 import time
 import uuid
 import os
 import asyncio
+import functools
+import random
+import socket
+from concurrent.futures import ThreadPoolExecutor
 import aiohttp
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
+import httpx
+import xxhash
+import redis.asyncio
+from redis.exceptions import RedisError
+import numpy as np
+from numba import njit
+from cachetools import LRUCache, TTLCache
+from typing import Annotated, AsyncIterator, Dict, List, Any, Optional, Tuple
+from enum import IntEnum
 import logging
+from contextlib import asynccontextmanager
+from urllib.parse import quote
 
-app = Flask(__name__)
-CORS(app)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pay JIT compilation cost before serving, and release upstream connections on shutdown"""
+    await fusion_engine.warmup()
+    yield
+    await fusion_engine.aclose()
+
+app = FastAPI(title="GENX AI Studio", default_response_class=ORJSONResponse, lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class GenerationRequest:
-    """Unified generation request structure"""
+# Upstream endpoints
+OPENROUTER_CHAT_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_MODELS = {
+    "claude-3-haiku": "anthropic/claude-3-haiku",
+    "gpt-4": "openai/gpt-4",
+    "gemini-pro": "google/gemini-pro"
+}
+IMAGE_URL_TEMPLATE = "https://image.pollinations.ai/prompt/{prompt}?width=1920&height=1080&seed={seed}"
+VIDEO_URL_TEMPLATE = "https://video.pollinations.ai/prompt/{prompt}?duration=10&fps=30"
+VOICE_URL_TEMPLATE = "https://audio.pollinations.ai/speech/{text}?voice=child&emotion={emotion}"
+MUSIC_URL_TEMPLATE = "https://audio.pollinations.ai/music/cinematic-{emotion}?tempo=120&key=C"
+
+# Prompt templates, parsed once; call with a dict of scene fields
+ENHANCEMENT_PROMPT = """Enhance this scene description for multimodal AI generation:
+
+Original: {text_prompt}
+Emotion: {emotion} ({pct}%)
+Style: {style}
+Camera: {camera_angle}
+
+Create an enhanced prompt that:
+1. Adds vivid visual details
+2. Incorporates emotional context
+3. Includes cinematic direction
+4. Optimizes for AI image/video generation
+
+Enhanced prompt:
+""".format_map
+WHEAT_FIELD_ENHANCEMENT = (
+    "Cinematic {camera_angle} shot of a young boy with {emotion} expression, running through a golden wheat field at golden hour. "
+    "Warm sunlight creates dramatic backlighting, wheat stalks swaying in gentle breeze. Dynamic movement with {style} cinematography, "
+    "{pct}% emotional intensity. Professional color grading with warm amber tones."
+).format_map
+GENERIC_ENHANCEMENT = (
+    "Professional {style} {camera_angle} shot featuring {text_prompt}. Emotional tone: {emotion} at {pct}% intensity. "
+    "Cinematic lighting and composition optimized for AI generation."
+).format_map
+
+# Lifetimes for job state and cached enhancements
+JOB_TTL_SECONDS = 3600
+EVENT_LOG_GRACE_SECONDS = 30
+ENHANCEMENT_TTL_SECONDS = 86400
+
+# Upstream concurrency caps per host and retry policy for rate-limited calls
+POLLINATIONS_CONCURRENCY = 64
+OPENROUTER_CONCURRENCY = 32
+UPSTREAM_RETRIES = 3
+RETRYABLE_STATUSES = frozenset({429, 502, 503})
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+
+# Lipsync lookup tables, indexed by the ids produced by _build_lipsync_arrays
+PHONEME_TABLE = ("A", "E", "I", "O", "U")
+MOUTH_SHAPE_TABLE = ("open", "smile", "narrow", "round", "pucker")
+_N_PHONEMES = len(PHONEME_TABLE)
+_N_MOUTH_SHAPES = len(MOUTH_SHAPE_TABLE)
+LIPSYNC_FRAMES = 50
+LIPSYNC_FPS = 10.0
+
+@njit(cache=True, nogil=True)
+def _build_lipsync_arrays(n_frames, fps):
+    """Build phoneme ids, timestamps and mouth-shape ids for n_frames lipsync frames"""
+    phoneme_ids = np.empty(n_frames, dtype=np.int8)
+    timestamps = np.empty(n_frames, dtype=np.float64)
+    mouth_ids = np.empty(n_frames, dtype=np.int8)
+    step = 1.0 / fps
+    for i in range(n_frames):
+        phoneme_ids[i] = i % _N_PHONEMES
+        timestamps[i] = i * step
+        mouth_ids[i] = i % _N_MOUTH_SHAPES
+    return phoneme_ids, timestamps, mouth_ids
+
+@functools.lru_cache(maxsize=32)
+def _lipsync_track(n_frames: int, fps: float) -> Tuple[Tuple[str, ...], Tuple[float, ...], Tuple[str, ...]]:
+    """Phonemes, timestamps and mouth shapes as immutable tuples, built once per worker for each shape"""
+    phoneme_ids, timestamps, mouth_ids = _build_lipsync_arrays(n_frames, fps)
+    return (
+        tuple(PHONEME_TABLE[i] for i in phoneme_ids.tolist()),
+        tuple(timestamps.tolist()),
+        tuple(MOUTH_SHAPE_TABLE[i] for i in mouth_ids.tolist())
+    )
+
+class GenerationRequest(msgspec.Struct, frozen=True):
+    """Unified generation request structure, decoded and validated straight from the request body"""
     scene_id: str
     text_prompt: str
     emotion: str
-    intensity: float
+    intensity: Annotated[float, msgspec.Meta(ge=0, le=1)]
     style: str
     camera_angle: str
     models: Dict[str, str]  # {"text": "claude-3-haiku", "image": "flux", "video": "seedance"}
-    parameters: Dict[str, Any]
+    parameters: Dict[str, Any] = msgspec.field(default_factory=dict)
 
-@dataclass
-class GenerationResult:
+class GenerationResult(msgspec.Struct):
     """Unified generation result structure"""
     request_id: str
     scene_id: str
@@ -45,15 +148,236 @@ class GenerationResult:
     metadata: Dict[str, Any]
     processing_time: float
 
+# Reused codecs; msgspec encodes GenerationResult in one pass without an intermediate dict
+# strict=False keeps accepting numeric strings for intensity, as float() did before
+REQUEST_DECODER = msgspec.json.Decoder(GenerationRequest, strict=False)
+JSON_ENCODER = msgspec.json.Encoder()
+
+class JobStatus(IntEnum):
+    """Lifecycle of a background generation job"""
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+class JobEventLog:
+    """Append-only record of a job's stage events that SSE clients replay and then follow"""
+    
+    def __init__(self):
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+        self._changed = asyncio.Condition()
+    
+    async def publish(self, name: str, payload: Dict[str, Any]):
+        """Record an event and wake every follower"""
+        self.events.append((name, payload))
+        async with self._changed:
+            self._changed.notify_all()
+    
+    async def follow(self) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield past events, then new ones as they arrive, until the job is done"""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > index)
+            name, payload = self.events[index]
+            index += 1
+            yield name, payload
+            if name == "done":
+                return
+
 class ModelFusionEngine:
     """Advanced model fusion and orchestration"""
     
     def __init__(self):
         self.openrouter_key = os.getenv('OPENROUTER_API_KEY', 'demo-key')
-        self.active_jobs = {}
+        # Task while a job runs, then its GenerationResult or JobStatus.FAILED once settled.
+        # Finished and abandoned jobs age out after an hour instead of accumulating forever.
+        self.active_jobs: TTLCache = TTLCache(maxsize=100_000, ttl=JOB_TTL_SECONDS)
+        # Unfinished tasks, kept separately so cache eviction can never drop the last reference
+        self._running_tasks: set = set()
+        # Stage events per job for the SSE stream; dropped shortly after the job is done, after
+        # which late clients get a snapshot from get_job_state instead
+        self.job_events: TTLCache = TTLCache(maxsize=100_000, ttl=JOB_TTL_SECONDS)
+        # OpenRouter goes through aiohttp; Pollinations through an HTTP/2 client so concurrent
+        # asset requests to the same host multiplex over one connection
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        # A burst of scenes would otherwise open 3N sockets at once and trip upstream rate limits
+        self._pollinations_limit = asyncio.Semaphore(POLLINATIONS_CONCURRENCY)
+        self._openrouter_limit = asyncio.Semaphore(OPENROUTER_CONCURRENCY)
+        # Enhanced prompts from OpenRouter, keyed by the request fields that determine them
+        self._enh_cache: LRUCache = LRUCache(maxsize=10_000)
+        # Shared job state and second-tier enhancement cache across workers; in-process only when unset
+        redis_url = os.getenv('REDIS_URL')
+        self.redis = redis.asyncio.from_url(redis_url, max_connections=200) if redis_url else None
+        # CPU-bound work (lipsync building, JIT compiles) runs here so the event loop stays responsive
+        self._cpu_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='cpu')
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the process-wide upstream session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            # aiodns resolves on the event loop instead of hopping to the default getaddrinfo thread pool
+            connector = aiohttp.TCPConnector(
+                limit=1000,
+                limit_per_host=256,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                resolver=aiohttp.AsyncResolver(),
+                family=socket.AF_INET
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=60),
+                json_serialize=lambda obj: orjson.dumps(obj).decode()
+            )
+        return self._session
+    
+    def _get_http(self) -> httpx.AsyncClient:
+        """Return the process-wide HTTP/2 client for Pollinations, creating it on first use"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=1000, max_keepalive_connections=500),
+                timeout=60.0
+            )
+        return self._http
+    
+    async def warmup(self):
+        """Compile the Numba kernels and build the default lipsync track off the event loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._cpu_pool, _lipsync_track, LIPSYNC_FRAMES, LIPSYNC_FPS)
+    
+    async def aclose(self):
+        """Cancel unfinished jobs and release upstream connections and worker threads"""
+        for task in list(self._running_tasks):
+            task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+        if self.redis is not None:
+            await self.redis.aclose()
+        self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+    
+    async def _redis_get(self, key: str) -> Optional[bytes]:
+        """Read a key from Redis, treating connection errors as a miss"""
+        if self.redis is None:
+            return None
+        try:
+            return await self.redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Redis read failed for {key}: {str(e)}")
+            return None
+    
+    async def _redis_set(self, key: str, value: bytes, ttl: int):
+        """Write a key to Redis with an expiry, logging rather than raising on failure"""
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(key, value, ex=ttl)
+        except RedisError as e:
+            logger.warning(f"Redis write failed for {key}: {str(e)}")
+    
+    async def _fetch_asset(self, url: str) -> bool:
+        """Request a Pollinations asset so it is generated and cached upstream"""
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            try:
+                async with self._pollinations_limit:
+                    # Only the status matters; closing the stream unread skips downloading the asset
+                    async with self._get_http().stream("GET", url) as resp:
+                        status, retry_after = resp.status_code, resp.headers.get("Retry-After")
+            except httpx.HTTPError as e:
+                logger.warning(f"Pollinations request failed for {url[:80]}: {str(e)}")
+                return False
+            delay = None if attempt == UPSTREAM_RETRIES else self._retry_delay(attempt, retry_after)
+            if status not in RETRYABLE_STATUSES or delay is None:
+                return status == 200
+            await asyncio.sleep(delay)
+    
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str]) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up because the server asked for a longer pause.
+        
+        Uses the server's Retry-After if given, else jittered exponential backoff.
+        """
+        if retry_after is not None and retry_after.isdigit():
+            # Retrying earlier than asked adds load exactly when the upstream is shedding it
+            delay = float(retry_after)
+            return delay if delay <= BACKOFF_MAX_SECONDS else None
+        return min(BACKOFF_BASE_SECONDS * 2 ** attempt, BACKOFF_MAX_SECONDS) * random.uniform(0.5, 1.0)
+    
+    async def submit_job(self, req: GenerationRequest) -> str:
+        """Schedule the pipeline as a background task and return its job id"""
+        job_id = str(uuid.uuid4())
+        # Publish before scheduling: a status poll routed to another worker then finds the job,
+        # and the task's final write can never be overwritten by this QUEUED record
+        await self._redis_set(f"job:{job_id}", JSON_ENCODER.encode(self._job_state(job_id, JobStatus.QUEUED)), JOB_TTL_SECONDS)
+        events = self.job_events[job_id] = JobEventLog()
+        task = asyncio.create_task(self._run_job(job_id, req, events))
+        self._running_tasks.add(task)
+        task.add_done_callback(functools.partial(self._job_done, job_id))
+        self.active_jobs[job_id] = task
+        return job_id
+    
+    async def _run_job(self, job_id: str, req: GenerationRequest, events: JobEventLog) -> GenerationResult:
+        """Run the pipeline and publish the job's final state to stream clients and other workers"""
+        result = None
+        try:
+            result = await self.process_multimodal_scene(req, events)
+            return result
+        finally:
+            state = self._job_state(job_id, JobStatus.FAILED if result is None else JobStatus.DONE, result)
+            await events.publish("done", state)
+            # Connected followers keep their own reference; only the lookup entry goes away
+            asyncio.get_running_loop().call_later(EVENT_LOG_GRACE_SECONDS, self.job_events.pop, job_id, None)
+            await self._redis_set(f"job:{job_id}", JSON_ENCODER.encode(state), JOB_TTL_SECONDS)
+    
+    @staticmethod
+    def _job_state(job_id: str, status: JobStatus, result: Optional[GenerationResult] = None) -> Dict[str, Any]:
+        """Status payload reported to clients for a job in the given state"""
+        if status is JobStatus.FAILED:
+            return {"job_id": job_id, "status": "failed", "progress": 100, "error": "Generation failed"}
+        if status is JobStatus.DONE:
+            return {"job_id": job_id, "status": result.status, "progress": 100, "result": result}
+        return {"job_id": job_id, "status": "processing", "progress": 0}
+    
+    @staticmethod
+    def _task_outcome(task: asyncio.Task) -> Tuple[JobStatus, Optional[GenerationResult]]:
+        """Status and result of a job task"""
+        if not task.done():
+            return JobStatus.RUNNING, None
+        if task.cancelled() or task.exception() is not None:
+            return JobStatus.FAILED, None
+        return JobStatus.DONE, task.result()
+    
+    async def get_job_state(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status payload for a job started on this worker or, via Redis, on any other"""
+        entry = self.active_jobs.get(job_id)
+        if isinstance(entry, asyncio.Task):
+            return self._job_state(job_id, *self._task_outcome(entry))
+        if isinstance(entry, GenerationResult):
+            return self._job_state(job_id, JobStatus.DONE, entry)
+        if entry is JobStatus.FAILED:
+            return self._job_state(job_id, JobStatus.FAILED)
+        
+        raw = await self._redis_get(f"job:{job_id}")
+        return orjson.loads(raw) if raw is not None else None
+    
+    def _job_done(self, job_id: str, task: asyncio.Task):
+        """Settle a finished job: keep only its result or failure status, and log failures"""
+        self._running_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Job {job_id} failed: {str(task.exception())}")
         
-    async def process_multimodal_scene(self, req: GenerationRequest) -> GenerationResult:
-        """Process a complete multimodal scene with model fusion"""
+        # Drop the Task (and any traceback frames it pins) unless the entry was already evicted
+        if job_id in self.active_jobs:
+            status, result = self._task_outcome(task)
+            self.active_jobs[job_id] = result if status is JobStatus.DONE else status
+    
+    async def process_multimodal_scene(self, req: GenerationRequest, events: Optional[JobEventLog] = None) -> GenerationResult:
+        """Process a complete multimodal scene with model fusion, reporting each finished stage to events"""
         start_time = time.time()
         request_id = str(uuid.uuid4())
         
@@ -61,72 +385,177 @@ class ModelFusionEngine:
         
         # Step 1: Text Enhancement with OpenRouter
         enhanced_text = await self._enhance_text_prompt(req)
+        await self._publish_stage(events, "text_enhancement", {"enhanced_prompt": enhanced_text})
         
-        # Step 2: Visual Generation with Pollinations
-        visual_outputs = await self._generate_visuals(req, enhanced_text)
+        # URL-encode the prompt and derive the image seed once for all Pollinations URLs.
+        # xxh3 is stable across processes, unlike the salted built-in hash(), so every
+        # worker requests the same image URL for a scene and hits the same CDN entry.
+        encoded_prompt = quote(enhanced_text, safe='')
+        seed = xxhash.xxh3_64_intdigest(req.scene_id) % 10000
         
-        # Step 3: Audio Generation
-        audio_outputs = await self._generate_audio(req, enhanced_text)
+        # Steps 2 & 3: Visual and audio generation only depend on the enhanced text, so run them together.
+        # The task group cancels both if the job is cancelled; a stage failure is absorbed by
+        # _tracked_stage so it never cancels its sibling.
+        async with asyncio.TaskGroup() as tg:
+            visual_task = tg.create_task(self._tracked_stage(events, "visual_generation", req, self._generate_visuals(req, encoded_prompt, seed)))
+            audio_task = tg.create_task(self._tracked_stage(events, "audio_generation", req, self._generate_audio(req, enhanced_text)))
+        visual_outputs, audio_outputs = visual_task.result(), audio_task.result()
+        
+        # _fetch_asset reports upstream failures as ready=False rather than raising, so a stage
+        # counts as failed when it raised or when none of its assets came back ready
+        readiness = self._asset_readiness(visual_outputs or {}, audio_outputs or {})
+        failed_assets = [asset for asset, ready in readiness.items() if not ready]
+        failed_stages = [
+            stage for stage, assets in (("visual_generation", ("image", "video")), ("audio_generation", ("voice", "music")))
+            if not any(readiness[asset] for asset in assets)
+        ]
+        if len(failed_assets) == len(readiness):
+            status = "failed"
+        elif failed_assets:
+            status = "partial"
+        else:
+            status = "completed"
         
         # Step 4: Model Fusion and Synchronization
-        fused_output = await self._fuse_modalities(visual_outputs, audio_outputs, req)
+        fused_output = await self._fuse_modalities(visual_outputs or {}, audio_outputs or {}, req, readiness)
+        await self._publish_stage(events, "fusion", fused_output)
         
         processing_time = time.time() - start_time
         
         result = GenerationResult(
             request_id=request_id,
             scene_id=req.scene_id,
-            status="completed",
+            status=status,
             outputs=fused_output,
             metadata={
                 "enhanced_prompt": enhanced_text,
                 "models_used": req.models,
                 "emotion_context": {"emotion": req.emotion, "intensity": req.intensity},
-                "processing_stages": ["text_enhancement", "visual_generation", "audio_generation", "fusion"]
+                "processing_stages": ["text_enhancement", "visual_generation", "audio_generation", "fusion"],
+                "failed_stages": failed_stages,
+                "failed_assets": failed_assets
             },
             processing_time=processing_time
         )
         
         return result
     
+    @staticmethod
+    def _asset_readiness(visual: Dict, audio: Dict) -> Dict[str, bool]:
+        """Whether each generated asset came back from Pollinations; missing stage outputs count as not ready"""
+        images, videos = visual.get("images", []), visual.get("videos", [])
+        return {
+            "image": bool(images) and images[0]["ready"],
+            "video": bool(videos) and videos[0]["ready"],
+            "voice": audio.get("voice", {}).get("ready", False),
+            "music": audio.get("music", {}).get("ready", False),
+        }
+    
+    @staticmethod
+    async def _publish_stage(events: Optional[JobEventLog], stage: str, output: Dict[str, Any]):
+        """Report a completed pipeline stage to stream clients"""
+        if events is not None:
+            await events.publish("stage", {"stage": stage, "output": output})
+    
+    async def _tracked_stage(self, events: Optional[JobEventLog], stage: str, req: GenerationRequest, coro) -> Optional[Dict[str, Any]]:
+        """Await a pipeline stage and report it the moment it finishes; returns None if the stage failed"""
+        try:
+            output = await coro
+        except Exception as e:
+            logger.error(f"Stage {stage} failed for scene {req.scene_id}: {str(e)}")
+            return None
+        await self._publish_stage(events, stage, output)
+        return output
+    
     async def _enhance_text_prompt(self, req: GenerationRequest) -> str:
         """Enhance text prompt using OpenRouter LLMs"""
-        enhancement_prompt = f"""
-        Enhance this scene description for multimodal AI generation:
-        
-        Original: {req.text_prompt}
-        Emotion: {req.emotion} ({req.intensity * 100}%)
-        Style: {req.style}
-        Camera: {req.camera_angle}
+        cache_key = self._enhancement_key(req)
+        cached = self._enh_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        Create an enhanced prompt that:
-        1. Adds vivid visual details
-        2. Incorporates emotional context
-        3. Includes cinematic direction
-        4. Optimizes for AI image/video generation
+        raw = await self._redis_get(f"enh:{cache_key}")
+        if raw is not None:
+            cached = self._enh_cache[cache_key] = raw.decode()
+            return cached
         
-        Enhanced prompt:
-        """
+        fields = {
+            "text_prompt": req.text_prompt,
+            "emotion": req.emotion,
+            "pct": req.intensity * 100,
+            "style": req.style,
+            "camera_angle": req.camera_angle
+        }
         
-        # Simulate OpenRouter API call
-        await asyncio.sleep(0.5)  # Simulate API latency
+        if self.openrouter_key != 'demo-key':
+            try:
+                enhanced = await self._call_openrouter(req, ENHANCEMENT_PROMPT(fields))
+                self._enh_cache[cache_key] = enhanced
+                await self._redis_set(f"enh:{cache_key}", enhanced.encode(), ENHANCEMENT_TTL_SECONDS)
+                return enhanced
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"OpenRouter enhancement failed for scene {req.scene_id}: {str(e)}")
         
-        # Mock enhanced response based on original scene
+        # Template enhancement when OpenRouter is unavailable
         if "wheat field" in req.text_prompt.lower():
-            enhanced = f"Cinematic {req.camera_angle} shot of a young boy with {req.emotion} expression, running through a golden wheat field at golden hour. Warm sunlight creates dramatic backlighting, wheat stalks swaying in gentle breeze. Dynamic movement with {req.style} cinematography, {req.intensity * 100}% emotional intensity. Professional color grading with warm amber tones."
-        else:
-            enhanced = f"Professional {req.style} {req.camera_angle} shot featuring {req.text_prompt}. Emotional tone: {req.emotion} at {req.intensity * 100}% intensity. Cinematic lighting and composition optimized for AI generation."
-        
-        return enhanced
+            return WHEAT_FIELD_ENHANCEMENT(fields)
+        return GENERIC_ENHANCEMENT(fields)
+    
+    @staticmethod
+    def _enhancement_key(req: GenerationRequest) -> str:
+        """Cache key covering every field that feeds the enhancement prompt"""
+        fields = [req.text_prompt, req.emotion, req.intensity, req.style, req.camera_angle, req.models.get("text", "claude-3-haiku")]
+        return xxhash.xxh3_128_hexdigest(orjson.dumps(fields))
     
-    async def _generate_visuals(self, req: GenerationRequest, enhanced_text: str) -> Dict[str, Any]:
+    async def _call_openrouter(self, req: GenerationRequest, prompt: str) -> str:
+        """Send a chat completion request to OpenRouter and return the reply text"""
+        model = req.models.get("text", "claude-3-haiku")
+        payload = {
+            "model": OPENROUTER_MODELS.get(model, model),
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        headers = {
+            "Authorization": f"Bearer {self.openrouter_key}",
+            "HTTP-Referer": "https://genx-ai-studio.vercel.app",
+            "X-Title": "GENX AI Studio"
+        }
+        for attempt in range(UPSTREAM_RETRIES + 1):
+            async with self._openrouter_limit:
+                async with self._get_session().post(OPENROUTER_CHAT_URL, json=payload, headers=headers) as resp:
+                    delay = None
+                    if resp.status in RETRYABLE_STATUSES and attempt < UPSTREAM_RETRIES:
+                        delay = self._retry_delay(attempt, resp.headers.get("Retry-After"))
+                    if delay is None:
+                        resp.raise_for_status()
+                        # A body that isn't valid JSON raises orjson.JSONDecodeError, a ValueError
+                        data = await resp.json(loads=orjson.loads)
+                        return self._reply_content(data)
+            # Back off outside the semaphore so waiting retries don't hold a slot
+            await asyncio.sleep(delay)
+    
+    @staticmethod
+    def _reply_content(data: Any) -> str:
+        """Completion text from an OpenRouter reply, raising ValueError if the reply is malformed or empty"""
+        try:
+            content = data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            content = None
+        if not isinstance(content, str) or not content.strip():
+            raise ValueError("OpenRouter reply has no completion text")
+        return content.strip()
+    
+    async def _generate_visuals(self, req: GenerationRequest, encoded_prompt: str, seed: int) -> Dict[str, Any]:
         """Generate images and videos using Pollinations"""
-        await asyncio.sleep(2.0)  # Simulate generation time
+        image_url = IMAGE_URL_TEMPLATE.format(prompt=encoded_prompt, seed=seed)
+        video_url = VIDEO_URL_TEMPLATE.format(prompt=encoded_prompt)
+        
+        image_ready, video_ready = await asyncio.gather(self._fetch_asset(image_url), self._fetch_asset(video_url))
         
         visual_outputs = {
             "images": [
                 {
-                    "url": f"https://image.pollinations.ai/prompt/{enhanced_text.replace(' ', '%20')}?width=1920&height=1080&seed={hash(req.scene_id) % 10000}",
+                    "url": image_url,
+                    "ready": image_ready,
                     "style": req.style,
                     "emotion_accuracy": 0.92,
                     "technical_quality": 0.89
@@ -134,7 +563,8 @@ class ModelFusionEngine:
             ],
             "videos": [
                 {
-                    "url": f"https://video.pollinations.ai/prompt/{enhanced_text.replace(' ', '%20')}?duration=10&fps=30",
+                    "url": video_url,
+                    "ready": video_ready,
                     "camera_work": req.camera_angle,
                     "motion_quality": 0.87,
                     "emotional_sync": 0.94
@@ -146,21 +576,30 @@ class ModelFusionEngine:
     
     async def _generate_audio(self, req: GenerationRequest, enhanced_text: str) -> Dict[str, Any]:
         """Generate audio content including voice and music"""
-        await asyncio.sleep(1.5)  # Simulate generation time
+        emotion = quote(req.emotion, safe='')
+        voice_url = VOICE_URL_TEMPLATE.format(text=quote(enhanced_text[:100], safe=''), emotion=emotion)
+        music_url = MUSIC_URL_TEMPLATE.format(emotion=emotion)
+        
+        voice_ready, music_ready = await asyncio.gather(self._fetch_asset(voice_url), self._fetch_asset(music_url))
+        
+        # Cached since warmup, so this is a lookup rather than an allocation per request
+        phonemes, timestamps, mouth_shapes = _lipsync_track(LIPSYNC_FRAMES, LIPSYNC_FPS)
         
         audio_outputs = {
             "voice": {
-                "url": f"https://audio.pollinations.ai/speech/{enhanced_text[:100]}?voice=child&emotion={req.emotion}",
+                "url": voice_url,
+                "ready": voice_ready,
                 "emotion_match": 0.91,
                 "naturalness": 0.88,
                 "lipsync_data": {
-                    "phonemes": ["A", "E", "I", "O", "U"] * 10,
-                    "timestamps": [i * 0.1 for i in range(50)],
-                    "mouth_shapes": ["open", "smile", "narrow", "round", "pucker"] * 10
+                    "phonemes": phonemes,
+                    "timestamps": timestamps,
+                    "mouth_shapes": mouth_shapes
                 }
             },
             "music": {
-                "url": f"https://audio.pollinations.ai/music/cinematic-{req.emotion}?tempo=120&key=C",
+                "url": music_url,
+                "ready": music_ready,
                 "mood_alignment": 0.93,
                 "emotional_progression": True,
                 "adaptive_sync": True
@@ -169,15 +608,18 @@ class ModelFusionEngine:
         
         return audio_outputs
     
-    async def _fuse_modalities(self, visual: Dict, audio: Dict, req: GenerationRequest) -> Dict[str, Any]:
-        """Advanced multimodal fusion and synchronization"""
+    async def _fuse_modalities(self, visual: Dict, audio: Dict, req: GenerationRequest, readiness: Dict[str, bool]) -> Dict[str, Any]:
+        """Advanced multimodal fusion and synchronization; readiness maps each asset to whether it was generated"""
         await asyncio.sleep(1.0)  # Simulate fusion processing
         
+        # Either modality may be empty when its stage raised
+        videos = visual.get("videos", [])
+        
         fused_output = {
             "primary_content": {
-                "video": visual["videos"][0]["url"],
-                "audio": audio["music"]["url"],
-                "voice": audio["voice"]["url"]
+                "video": videos[0]["url"] if videos else None,
+                "audio": audio.get("music", {}).get("url"),
+                "voice": audio.get("voice", {}).get("url")
             },
             "synchronized_timeline": {
                 "total_duration": 10.0,
@@ -192,9 +634,9 @@ class ModelFusionEngine:
                 "creative_score": 0.89
             },
             "render_ready": {
-                "flux_pipeline": True,
-                "lipsync_enabled": True,
-                "seedance_processing": True,
+                "flux_pipeline": readiness["image"],
+                "lipsync_enabled": readiness["voice"],
+                "seedance_processing": readiness["video"],
                 "webgl_optimized": True
             }
         }
@@ -204,49 +646,56 @@ class ModelFusionEngine:
 # Initialize the fusion engine
 fusion_engine = ModelFusionEngine()
 
-@app.route('/health', methods=['GET'])
-def health_check():
+# Static payloads, serialized once at import
+HEALTH_JSON = orjson.dumps({
+    "status": "healthy",
+    "version": "1.0.0",
+    "components": {
+        "model_fusion": "operational",
+        "openrouter": "connected",
+        "pollinations": "connected",
+        "flux_pipeline": "ready"
+    }
+})
+
+MODELS_JSON = orjson.dumps({
+    "text_models": [
+        {"id": "claude-3-haiku", "name": "Claude 3 Haiku", "type": "fast"},
+        {"id": "gpt-4", "name": "GPT-4", "type": "premium"},
+        {"id": "gemini-pro", "name": "Gemini Pro", "type": "balanced"}
+    ],
+    "image_models": [
+        {"id": "flux", "name": "Flux", "type": "photorealistic"},
+        {"id": "flux-realism", "name": "Flux Realism", "type": "hyperrealistic"},
+        {"id": "flux-anime", "name": "Flux Anime", "type": "artistic"}
+    ],
+    "video_models": [
+        {"id": "seedance", "name": "Seedance", "type": "motion"},
+        {"id": "lens-warp", "name": "Lens Warp", "type": "cinematic"}
+    ],
+    "audio_models": [
+        {"id": "pollinations-voice", "name": "Pollinations Voice", "type": "speech"},
+        {"id": "pollinations-music", "name": "Pollinations Music", "type": "soundtrack"}
+    ]
+})
+
+@app.get('/health')
+async def health_check():
     """Health check endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "version": "1.0.0",
-        "components": {
-            "model_fusion": "operational",
-            "openrouter": "connected",
-            "pollinations": "connected",
-            "flux_pipeline": "ready"
-        }
-    })
+    return Response(HEALTH_JSON, media_type='application/json')
 
-@app.route('/api/v1/generate/multimodal', methods=['POST'])
-def generate_multimodal():
+@app.post('/api/v1/generate/multimodal')
+async def generate_multimodal(request: Request):
     """Generate multimodal content with model fusion"""
     try:
-        data = request.get_json()
-        
-        # Validate request
-        required_fields = ['scene_id', 'text_prompt', 'emotion', 'intensity', 'style', 'camera_angle', 'models']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-        
-        # Create generation request
-        gen_request = GenerationRequest(
-            scene_id=data['scene_id'],
-            text_prompt=data['text_prompt'],
-            emotion=data['emotion'],
-            intensity=float(data['intensity']),
-            style=data['style'],
-            camera_angle=data['camera_angle'],
-            models=data['models'],
-            parameters=data.get('parameters', {})
-        )
+        try:
+            gen_request = REQUEST_DECODER.decode(await request.body())
+        except msgspec.DecodeError as e:
+            return ORJSONResponse({"error": f"Invalid request: {str(e)}"}, status_code=400)
         
-        # Start async processing
-        job_id = str(uuid.uuid4())
-        fusion_engine.active_jobs[job_id] = "processing"
+        # Start async processing; the response does not wait on the pipeline
+        job_id = await fusion_engine.submit_job(gen_request)
         
-        # For demo, return immediate mock result
         result = {
             "job_id": job_id,
             "status": "processing",
@@ -254,52 +703,59 @@ def generate_multimodal():
             "progress_url": f"/api/v1/jobs/{job_id}/status"
         }
         
-        return jsonify(result), 202
+        return ORJSONResponse(result, status_code=202)
         
     except Exception as e:
         logger.error(f"Error in multimodal generation: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
+        return ORJSONResponse({"error": "Internal server error"}, status_code=500)
 
-@app.route('/api/v1/jobs/<job_id>/status', methods=['GET'])
-def get_job_status(job_id):
+@app.get('/api/v1/jobs/{job_id}/status')
+async def get_job_status(job_id: str):
     """Get processing job status"""
-    if job_id not in fusion_engine.active_jobs:
-        return jsonify({"error": "Job not found"}), 404
+    state = await fusion_engine.get_job_state(job_id)
+    if state is None:
+        return ORJSONResponse({"error": "Job not found"}, status_code=404)
     
-    # Mock progressive status
-    mock_result = {
-        "job_id": job_id,
-        "status": "completed",
-        "progress": 100,
-        "result": {
-            "scene_id": "scene-001",
-            "outputs": {
-                "video": "https://example.com/generated-video.mp4",
-                "audio": "https://example.com/generated-audio.mp3",
-                "metadata": {
-                    "emotion_accuracy": 0.94,
-                    "visual_quality": 0.91,
-                    "audio_sync": 0.96
-                }
-            },
-            "processing_time": 25.3
-        }
-    }
+    # Returning the response directly skips FastAPI's jsonable_encoder pass over the result
+    return Response(JSON_ENCODER.encode(state), media_type='application/json')
+
+async def _sse_events(events: JobEventLog) -> AsyncIterator[bytes]:
+    """Encode job events in Server-Sent Events framing"""
+    async for name, payload in events.follow():
+        yield b"event: " + name.encode() + b"\ndata: " + JSON_ENCODER.encode(payload) + b"\n\n"
+
+async def _sse_snapshot(state: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """Single SSE event carrying a job's last known state"""
+    name = b"status" if state["status"] == "processing" else b"done"
+    yield b"event: " + name + b"\ndata: " + JSON_ENCODER.encode(state) + b"\n\n"
+
+@app.get('/api/v1/jobs/{job_id}/stream')
+async def stream_job(job_id: str):
+    """Stream pipeline stage completions as Server-Sent Events"""
+    events = fusion_engine.job_events.get(job_id)
+    if events is not None:
+        body = _sse_events(events)
+    else:
+        # The job belongs to another worker; send its shared state once so the client can fall back to polling
+        state = await fusion_engine.get_job_state(job_id)
+        if state is None:
+            return ORJSONResponse({"error": "Job not found"}, status_code=404)
+        body = _sse_snapshot(state)
     
-    return jsonify(mock_result)
+    return StreamingResponse(body, media_type='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-@app.route('/api/v1/enhance/prompt', methods=['POST'])
-def enhance_prompt():
+@app.post('/api/v1/enhance/prompt')
+async def enhance_prompt(request: Request):
     """Enhance text prompt using LLM"""
     try:
-        data = request.get_json()
+        data = orjson.loads(await request.body())
         prompt = data.get('prompt', '')
         context = data.get('context', {})
         
         # Mock prompt enhancement
         enhanced = f"Enhanced cinematic prompt: {prompt} with {context.get('emotion', 'neutral')} emotion at {context.get('intensity', 0.5) * 100}% intensity. Professional cinematography with {context.get('style', 'realistic')} style."
         
-        return jsonify({
+        return ORJSONResponse({
             "original": prompt,
             "enhanced": enhanced,
             "improvements": [
@@ -312,34 +768,24 @@ def enhance_prompt():
         
     except Exception as e:
         logger.error(f"Error in prompt enhancement: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
+        return ORJSONResponse({"error": "Internal server error"}, status_code=500)
 
-@app.route('/api/v1/fusion/models', methods=['GET'])
-def list_available_models():
+@app.get('/api/v1/fusion/models')
+async def list_available_models():
     """List available models for fusion"""
-    models = {
-        "text_models": [
-            {"id": "claude-3-haiku", "name": "Claude 3 Haiku", "type": "fast"},
-            {"id": "gpt-4", "name": "GPT-4", "type": "premium"},
-            {"id": "gemini-pro", "name": "Gemini Pro", "type": "balanced"}
-        ],
-        "image_models": [
-            {"id": "flux", "name": "Flux", "type": "photorealistic"},
-            {"id": "flux-realism", "name": "Flux Realism", "type": "hyperrealistic"},
-            {"id": "flux-anime", "name": "Flux Anime", "type": "artistic"}
-        ],
-        "video_models": [
-            {"id": "seedance", "name": "Seedance", "type": "motion"},
-            {"id": "lens-warp", "name": "Lens Warp", "type": "cinematic"}
-        ],
-        "audio_models": [
-            {"id": "pollinations-voice", "name": "Pollinations Voice", "type": "speech"},
-            {"id": "pollinations-music", "name": "Pollinations Music", "type": "soundtrack"}
-        ]
-    }
-    
-    return jsonify(models)
+    return Response(MODELS_JSON, media_type='application/json')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # Without REDIS_URL job state is per-process, so only fan out across workers when it is shared
+    workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() if os.getenv('REDIS_URL') else 1))
+    uvicorn.run(
+        'app:app',
+        host='0.0.0.0',
+        port=port,
+        workers=workers,
+        loop='uvloop',
+        http='httptools',
+        log_level='info',
+        access_log=False
+    )
\ No newline at end of file